@@ -7,15 +7,85 @@ This module demonstrates the core pattern for building NetBox agents:
 3. Run an autonomous agent loop that iteratively calls tools
 4. Parse and return structured results
 
-The agent operates in a single-run mode (stateless) for simplicity.
+The agent itself is stateless per run; the MCP server connection is pooled
+so repeated checks in one process reuse the same subprocess.
 """
 
+import asyncio
+import json
+import logging
 import os
-from typing import Dict, Any, Optional
+import re
+from typing import Dict, Any, List, Literal, Optional, Set, Tuple
+import litellm
 from agents import Agent, Runner
 from agents.extensions.models.litellm_model import LitellmModel
-from .mcp import create_mcp_server
-from .prompts import SYSTEM_INSTRUCTIONS
+from pydantic import BaseModel, Field
+from . import __version__, cache
+from .mcp import (
+    DEFAULT_MAX_RESULT_BYTES,
+    CountingMCPServer,
+    acquire_mcp_server,
+    get_or_create_mcp_server,
+)
+from .prompts import SYSTEM_INSTRUCTIONS, TRIAGE_INSTRUCTIONS
+
+# Initial message for each check. The last lines spell out the filter
+# arguments so the agent scopes its queries in NetBox instead of fetching
+# everything and filtering the results itself
+_MESSAGE_TEMPLATE = (
+    "Check this compliance rule: {rule}\n\n"
+    "Scope: {scope}{limit_line}\n"
+    "Use these filters on netbox_get_objects calls for each object type:\n"
+    "{filters}\n"
+    "(NetBox ignores filters it does not know and returns every object"
+    "{id_note}){limit_arg}"
+)
+
+# Filters that restrict each object type to a scope key, as
+# (object_type, filter_name, takes_id). Sites and racks only filter other
+# object types by ID; a device filters its components by name.
+_SCOPE_FILTERS: Dict[str, List[Tuple[str, str, bool]]] = {
+    "site": [
+        ("sites", "name", False),
+        ("racks", "site_id", True),
+        ("devices", "site_id", True),
+        ("interfaces", "site_id", True),
+    ],
+    "rack": [
+        ("racks", "name", False),
+        ("devices", "rack_id", True),
+        ("interfaces", "rack_id", True),
+    ],
+    "device": [
+        ("devices", "name", False),
+        ("interfaces", "device", False),
+        ("ip-addresses", "device", False),
+    ],
+}
+
+logger = logging.getLogger(__name__)
+
+# Triage models whose failure was already reported, so repeated checks warn once
+_TRIAGE_FAILURES_REPORTED: Set[str] = set()
+
+# Pulls the JSON object out of the triage model's reply
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+
+class ComplianceResult(BaseModel):
+    """Structured verdict the agent must return for every check."""
+
+    status: Literal["PASS", "FAIL", "UNKNOWN"] = Field(
+        description="PASS or FAIL, or UNKNOWN if NetBox data cannot answer the rule"
+    )
+    summary: str = Field(description="What was checked and the outcome")
+    findings: List[str] = Field(
+        description="One entry per non-compliant item (empty if PASS)"
+    )
+    coverage: str = Field(
+        description='What was examined, e.g. "Checked 4 devices in site DM-Akron"'
+    )
 
 
 async def run_once(
@@ -28,6 +98,10 @@ async def run_once(
     netbox_token: str,
     limit: Optional[int] = None,
     max_steps: int = 25,
+    use_cache: bool = True,
+    triage_model: Optional[str] = None,
+    max_result_bytes: Optional[int] = DEFAULT_MAX_RESULT_BYTES,
+    triage_api_key: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Run a single compliance check against NetBox using an autonomous agent loop.
@@ -47,109 +121,430 @@ async def run_once(
         netbox_token: NetBox API token
         limit: Optional limit on number of objects to check (for demos/testing)
         max_steps: Maximum number of agent steps (prevents runaway loops)
+        use_cache: Reuse a stored result when NetBox has not changed since
+        triage_model: Cheaper model that screens out rules NetBox cannot check
+            before the full agent loop runs (skipped when None)
+        max_result_bytes: Truncate larger tool results before the agent sees them
+            (None disables truncation)
+        triage_api_key: API key for the triage model's provider. Defaults to
+            api_key when both models share a provider, otherwise to LiteLLM's
+            provider environment variables (e.g. ANTHROPIC_API_KEY)
 
     Returns:
         Dictionary containing compliance check results
     """
 
+    # STEP 0 (optional): Screen out rules NetBox has no data for
+    # A small model answers this in one call, so infeasible rules never run
+    # the expensive agent loop. It runs in the background while the MCP
+    # server starts, hiding the subprocess spawn behind the triage call.
+    triage_task = None
+    if triage_model:
+        if triage_api_key is None and _provider(triage_model) == _provider(model):
+            triage_api_key = api_key or os.getenv("API_KEY")
+        triage_task = asyncio.create_task(
+            _is_checkable(rule, triage_model, triage_api_key)
+        )
+
     # STEP 1: Establish MCP connection to NetBox
     # The MCP server runs as a subprocess and exposes NetBox data via tools
     # We use stdio communication (stdin/stdout) for security and simplicity
-    async with create_mcp_server(
+    # Inside mcp_server_pool() the connection is pooled, so later checks
+    # skip the spawn; otherwise it is closed when this check finishes
+    try:
+        async with acquire_mcp_server(
+            mcp_dir=mcp_dir,
+            netbox_url=netbox_url,
+            netbox_token=netbox_token,
+            max_result_bytes=max_result_bytes,
+        ) as server:
+            # Fetch the tool list now; it stays cached on the connection
+            await server.list_tools()
+
+            # Start from a clean call history and result cache for this check; a
+            # pooled server still holds state from the previous one
+            server.reset_session_state()
+            server.begin_run()
+
+            # Serve a stored result if nothing changed in NetBox since it was computed
+            # The latest changelog ID is part of the key, so any change invalidates it.
+            # So are the package version and prompts, which shape the result, and
+            # the token, since NetBox permissions limit what it can see
+            cache_key = None
+            if use_cache:
+                changelog_id = await _latest_changelog_id(server)
+                if changelog_id is not None:
+                    cache_key = cache.make_key(
+                        __version__,
+                        SYSTEM_INSTRUCTIONS,
+                        _MESSAGE_TEMPLATE,
+                        rule,
+                        json.dumps(scope, sort_keys=True),
+                        model,
+                        str(limit),
+                        str(max_steps),
+                        netbox_url,
+                        netbox_token,
+                        str(max_result_bytes),
+                        str(changelog_id),
+                    )
+                    cached = cache.get(cache_key)
+                    if cached is not None:
+                        return {**cached, "cached": True}
+
+            # Only reached on a cache miss; a hit returns before paying for triage
+            if triage_task is not None:
+                checkable, reason = await triage_task
+                if not checkable:
+                    verdict = ComplianceResult(
+                        status="UNKNOWN",
+                        summary=reason,
+                        findings=[],
+                        coverage="No NetBox data was examined; the rule cannot be "
+                        "checked with NetBox data.",
+                    )
+                    return _result_dict(verdict, tool_calls=0)
+
+            calls_before = server.tool_call_count
+
+            # STEP 2: Initialize the agent with LLM and MCP tools
+            agent = _build_agent(server, model, api_key)
+
+            # STEP 3: Prepare the user's request
+            # We format the rule and scope into a clear instruction for the agent
+            initial_message = _format_message(rule, scope, limit)
+
+            # STEP 4: Run the autonomous agent loop
+            # The Runner handles the back-and-forth between LLM and tools
+            # The agent will:
+            # 1. Understand the rule and scope
+            # 2. Call MCP tools to fetch NetBox data
+            # 3. Iteratively explore until it can determine compliance
+            # 4. Stop when complete or at max_turns
+            result = await Runner.run(
+                starting_agent=agent,
+                input=initial_message,
+                max_turns=max_steps,  # Safety limit to prevent infinite loops
+            )
+
+            # STEP 5: Extract metrics and return results
+            # We track tool calls to show how much work the agent did
+            # The pooled server's counter spans runs, so report this run's share
+            tool_calls = server.tool_call_count - calls_before
+
+            # Convert the agent's structured verdict into the result dictionary
+            response = parse_agent_response(result, tool_calls)
+            if cache_key is not None:
+                cache.put(cache_key, response)
+            return response
+    finally:
+        # Not needed once awaited; stops a pending triage call on cache hits
+        # and errors
+        if triage_task is not None:
+            triage_task.cancel()
+
+
+async def preload(
+    mcp_dir: str,
+    netbox_url: str,
+    netbox_token: str,
+    max_result_bytes: Optional[int] = DEFAULT_MAX_RESULT_BYTES,
+) -> CountingMCPServer:
+    """
+    Warm up the pooled MCP server so the first check starts without delay.
+
+    Spawns (or reuses) the pooled server and fetches its tool list, which
+    stays cached on the connection. Await it inside mcp_server_pool(), in the
+    task that entered the block; the stdio transport must be closed by the
+    task that opened it.
+
+    Args:
+        mcp_dir: Directory containing the NetBox MCP server
+        netbox_url: NetBox instance URL
+        netbox_token: NetBox API token
+        max_result_bytes: Truncate larger tool results before the agent sees them
+            (None disables truncation)
+
+    Returns:
+        Connected CountingMCPServer instance
+    """
+
+    server = await get_or_create_mcp_server(
         mcp_dir=mcp_dir,
         netbox_url=netbox_url,
         netbox_token=netbox_token,
+        max_result_bytes=max_result_bytes,
+    )
+    await server.list_tools()
+    return server
+
+
+async def run_batch(
+    rules: List[Tuple[str, Dict[str, str]]],
+    model: str,
+    api_key: Optional[str],
+    mcp_dir: str,
+    netbox_url: str,
+    netbox_token: str,
+    limit: Optional[int] = None,
+    max_steps: int = 25,
+    max_concurrency: int = 4,
+    max_result_bytes: Optional[int] = DEFAULT_MAX_RESULT_BYTES,
+) -> List[Dict[str, Any]]:
+    """
+    Run several compliance checks against NetBox sharing one MCP server and agent.
+
+    Acquiring the MCP server and building the agent is the same work for
+    every rule, so a batch pays for it once and then runs all agent loops
+    concurrently over the shared connection.
+
+    Args:
+        rules: List of (rule, scope) pairs to check
+        model: Model identifier for LiteLLM
+        api_key: API key for the model provider
+        mcp_dir: Directory containing the NetBox MCP server
+        netbox_url: NetBox instance URL
+        netbox_token: NetBox API token
+        limit: Optional limit on number of objects to check per rule
+        max_steps: Maximum number of agent steps per rule
+        max_concurrency: Maximum number of agent loops running at once
+        max_result_bytes: Truncate larger tool results before the agent sees them
+            (None disables truncation)
+
+    Returns:
+        List of compliance check results, in the same order as ``rules``.
+        A rule whose check raised gets an UNKNOWN result with an "error" key
+        instead of failing the whole batch.
+    """
+
+    if not rules:
+        return []
+
+    async with acquire_mcp_server(
+        mcp_dir=mcp_dir,
+        netbox_url=netbox_url,
+        netbox_token=netbox_token,
+        max_result_bytes=max_result_bytes,
     ) as server:
-        # Get API key and validate it exists
-        final_api_key = api_key or os.getenv("API_KEY")
-        if not final_api_key:
-            raise ValueError(
-                "API key is required. Set API_KEY environment variable or use --api-key option."
+        server.reset_session_state()
+        agent = _build_agent(server, model, api_key)
+
+        # Bound concurrent LLM sessions to stay clear of provider rate limits
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run_rule(rule: str, scope: Dict[str, str]) -> Dict[str, Any]:
+            # Each rule runs in its own task, so this gives it a private
+            # duplicate-call history on the shared server
+            server.begin_run()
+            async with semaphore:
+                result = await Runner.run(
+                    starting_agent=agent,
+                    input=_format_message(rule, scope, limit),
+                    max_turns=max_steps,
+                )
+            # The server's counter is shared by every run in the batch, so count
+            # each run's own tool calls from the items it produced instead
+            return parse_agent_response(
+                result,
+                sum(1 for item in result.new_items if item.type == "tool_call_item"),
             )
 
-        # Set OPENAI_API_KEY to suppress trace warnings
-        if not os.getenv("OPENAI_API_KEY"):
-            os.environ["OPENAI_API_KEY"] = final_api_key
-
-        # STEP 2: Initialize the agent with LLM and MCP tools
-        # The Agent combines:
-        # - System instructions (how to check compliance)
-        # - LLM model (via LiteLLM for flexibility)
-        # - MCP server connection (provides NetBox tools)
-        agent = Agent(
-            name="NetBoxComplianceChecker",
-            instructions=SYSTEM_INSTRUCTIONS,  # Detailed prompting strategy
-            model=LitellmModel(
-                model=model,  # Works with any LiteLLM-supported model
-                api_key=final_api_key,
-            ),
-            mcp_servers=[server],  # Agent can now call NetBox tools
+        # One failing rule (max turns, bad model output, rate limit) must not
+        # discard the results of the others
+        results = await asyncio.gather(
+            *[run_rule(rule, scope) for rule, scope in rules],
+            return_exceptions=True,
         )
+        return [
+            _error_result_dict(result) if isinstance(result, Exception) else result
+            for result in results
+        ]
+
 
-        # STEP 3: Prepare the user's request
-        # We format the rule and scope into a clear instruction for the agent
-        initial_message = f"""Check this compliance rule: {rule}
-
-Scope: {", ".join(f"{k}={v}" for k, v in scope.items())}"""
-
-        if limit:
-            initial_message += f"\nLimit: Check up to {limit} objects only (demo mode)"
-
-        # STEP 4: Run the autonomous agent loop
-        # The Runner handles the back-and-forth between LLM and tools
-        # The agent will:
-        # 1. Understand the rule and scope
-        # 2. Call MCP tools to fetch NetBox data
-        # 3. Iteratively explore until it can determine compliance
-        # 4. Stop when complete or at max_turns
-        result = await Runner.run(
-            starting_agent=agent,
-            input=initial_message,
-            max_turns=max_steps,  # Safety limit to prevent infinite loops
+async def _is_checkable(
+    rule: str, model: str, api_key: Optional[str]
+) -> Tuple[bool, str]:
+    """
+    Ask a lightweight model whether NetBox holds the data a rule needs.
+
+    Fails open: if the call errors or the reply cannot be parsed, the rule is
+    treated as checkable and the full agent decides. The first failure for
+    each model is logged, since every later check would fail the same way.
+
+    Returns:
+        Tuple of (checkable, reason)
+    """
+
+    try:
+        response = await litellm.acompletion(
+            model=model,
+            api_key=api_key,
+            messages=[
+                {"role": "system", "content": TRIAGE_INSTRUCTIONS},
+                {"role": "user", "content": f"Rule: {rule}"},
+            ],
         )
+        reply = response.choices[0].message.content or ""
+        verdict = json.loads(_JSON_OBJECT_RE.search(reply).group(0))
+    except Exception as e:
+        if model not in _TRIAGE_FAILURES_REPORTED:
+            _TRIAGE_FAILURES_REPORTED.add(model)
+            logger.warning(
+                "Triage with %s failed, running the full check instead: %s: %s",
+                model,
+                type(e).__name__,
+                e,
+            )
+        return True, ""
 
-        # STEP 5: Extract metrics and return results
-        # We track tool calls to show how much work the agent did
-        tool_calls = server.tool_call_count if hasattr(server, "tool_call_count") else 0
+    return verdict.get("checkable") is not False, str(verdict.get("reason", ""))
+
+
+def _provider(model: str) -> str:
+    """Return the LiteLLM provider prefix of a model name (e.g. "openai")."""
+    return model.split("/", 1)[0] if "/" in model else ""
+
+
+async def _latest_changelog_id(server: Any) -> Optional[int]:
+    """Return the ID of NetBox's most recent changelog entry, if available."""
+
+    try:
+        result = await server.call_tool(
+            "netbox_get_changelogs", {"filters": {}, "limit": 1}
+        )
+        data = json.loads(result.content[0].text)
+    except Exception:
+        # No cursor means no safe cache key; the check simply runs uncached
+        return None
 
-        # Parse and structure the agent's natural language response
-        return parse_agent_response(result, tool_calls)
+    # Changelogs are returned newest first, either paginated or as a plain list
+    entries = data.get("results", []) if isinstance(data, dict) else data
+    if entries and isinstance(entries[0], dict):
+        return entries[0].get("id")
+    return None
+
+
+def _build_agent(server: Any, model: str, api_key: Optional[str]) -> Agent:
+    """Create the compliance agent bound to an MCP server connection."""
+
+    # Get API key and validate it exists
+    final_api_key = api_key or os.getenv("API_KEY")
+    if not final_api_key:
+        raise ValueError(
+            "API key is required. Set API_KEY environment variable or use --api-key option."
+        )
+
+    # Set OPENAI_API_KEY to suppress trace warnings
+    if not os.getenv("OPENAI_API_KEY"):
+        os.environ["OPENAI_API_KEY"] = final_api_key
+
+    # The Agent combines:
+    # - System instructions (how to check compliance)
+    # - LLM model (via LiteLLM for flexibility)
+    # - MCP server connection (provides NetBox tools)
+    return Agent(
+        name="NetBoxComplianceChecker",
+        instructions=SYSTEM_INSTRUCTIONS,  # Detailed prompting strategy
+        model=LitellmModel(
+            model=model,  # Works with any LiteLLM-supported model
+            api_key=final_api_key,
+        ),
+        mcp_servers=[server],  # Agent can now call NetBox tools
+        output_type=ComplianceResult,  # Final answer must match this schema
+    )
+
+
+def format_scope(scope: Dict[str, str]) -> str:
+    """Format a scope dictionary for display, e.g. "site=NYC, rack=R01"."""
+
+    return ", ".join(f"{k}={v}" for k, v in scope.items())
+
+
+def _format_message(rule: str, scope: Dict[str, str], limit: Optional[int]) -> str:
+    """Format a rule and its scope into the agent's initial message."""
+
+    filters = _format_scope_filters(scope)
+    return _MESSAGE_TEMPLATE.format(
+        rule=rule,
+        scope=format_scope(scope),
+        limit_line=(
+            f"\nLimit: Check up to {limit} objects only (demo mode)" if limit else ""
+        ),
+        filters=filters,
+        id_note=(
+            "; look up each <ID of ...> by name first" if "<ID of" in filters else ""
+        ),
+        limit_arg=(
+            f"\nPass limit={limit} on every netbox_get_objects call" if limit else ""
+        ),
+    )
+
+
+def _format_scope_filters(scope: Dict[str, str]) -> str:
+    """List the filters that apply a scope to each object type, one per line."""
+
+    # Merge per object type so a site and rack scope becomes one filter set
+    by_type: Dict[str, List[str]] = {}
+    for key, value in scope.items():
+        for object_type, name, takes_id in _SCOPE_FILTERS.get(key, []):
+            arg = (
+                f"<ID of {key} {json.dumps(value)}>" if takes_id else json.dumps(value)
+            )
+            by_type.setdefault(object_type, []).append(f'"{name}": {arg}')
+    return "\n".join(
+        f"- {object_type}: filters={{{', '.join(args)}}}"
+        for object_type, args in by_type.items()
+    )
 
 
 def parse_agent_response(response: Any, tool_calls: int = 0) -> Dict[str, Any]:
     """
-    Extract minimal information from agent response.
+    Turn the agent's structured result into the dictionary callers consume.
 
-    This parser is intentionally simple - we let the agent format its own
-    output in markdown and just extract the key status for programmatic use.
-    This approach keeps the code minimal while giving the LLM full control
-    over how to present findings to users.
+    The agent returns a ComplianceResult (enforced through the model's JSON
+    schema support), so no text scraping is needed. A markdown rendering is
+    included as raw_output for display.
 
     Args:
-        response: Raw response from the agent
+        response: Run result from the agent
         tool_calls: Number of tool calls made
 
     Returns:
-        Dictionary with raw output and basic metadata
+        Dictionary with the result fields, markdown report, and basic metadata
     """
 
-    # Get the raw output - this contains the agent's full markdown report
-    raw_output = (
-        str(response.final_output)
-        if hasattr(response, "final_output")
-        else str(response)
+    result = response.final_output_as(ComplianceResult, raise_if_incorrect_type=True)
+    return _result_dict(result, tool_calls)
+
+
+def format_report(result: ComplianceResult) -> str:
+    """Render a ComplianceResult as the markdown report shown to users."""
+
+    sections = [f"## Status: {result.status}", f"## Summary\n{result.summary}"]
+    if result.findings:
+        findings = "\n".join(f"- {finding}" for finding in result.findings)
+        sections.append(f"## Findings\n{findings}")
+    sections.append(f"## Coverage\n{result.coverage}")
+    return "\n\n".join(sections)
+
+
+def _error_result_dict(error: Exception) -> Dict[str, Any]:
+    """Build an UNKNOWN result for a check that raised instead of finishing."""
+
+    verdict = ComplianceResult(
+        status="UNKNOWN",
+        summary=f"The check did not complete: {type(error).__name__}: {error}",
+        findings=[],
+        coverage="Results are incomplete; re-run this rule on its own to retry.",
     )
+    return {**_result_dict(verdict, tool_calls=0), "error": str(error)}
+
 
-    # Extract just the status for basic routing
-    # The agent is instructed to always include "PASS" or "FAIL" in its output
-    status = "UNKNOWN"
-    if "Status: FAIL" in raw_output:
-        status = "FAIL"
-    elif "Status: PASS" in raw_output:
-        status = "PASS"
+def _result_dict(result: ComplianceResult, tool_calls: int) -> Dict[str, Any]:
+    """Build the result dictionary returned by run_once and run_batch."""
 
     return {
-        "raw_output": raw_output,  # Full markdown report for display
-        "status": status,  # Extracted status for programmatic use
+        **result.model_dump(),  # status, summary, findings, coverage
+        "raw_output": format_report(result),  # Markdown report for display
         "tool_calls": tool_calls,  # Metric showing agent's work
     }
@@ -0,0 +1,59 @@
+"""
+On-disk cache for compliance check results.
+
+Re-running an unchanged rule against unchanged NetBox data gives the same
+answer, so results are stored as JSON files keyed by a hash of everything that
+influences them: the package version and prompts, the rule, scope, model,
+limits, NetBox URL and token, and the latest NetBox changelog ID. Any change
+recorded in NetBox's changelog produces a new key, which keeps stale results
+from being served. Only the hash is written, so tokens never reach the disk.
+
+Entries live in $XDG_CACHE_HOME/netbox-agent-compliance (default
+~/.cache/netbox-agent-compliance) and can be deleted at any time.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Optional
+
+
+def cache_dir() -> str:
+    """Return the directory that holds cached results."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "netbox-agent-compliance")
+
+
+def make_key(*parts: str) -> str:
+    """Hash the given parts into a cache key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") differ
+        encoded = part.encode("utf-8")
+        digest.update(f"{len(encoded)}:".encode("ascii"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """Return the cached result for key, or None if missing or unreadable."""
+    try:
+        with open(os.path.join(cache_dir(), f"{key}.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def put(key: str, value: Dict[str, Any]) -> None:
+    """Store a result under key; failures are ignored since caching is optional."""
+    directory = cache_dir()
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temp file and rename so readers never see partial JSON
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, os.path.join(directory, f"{key}.json"))
+    except OSError:
+        pass
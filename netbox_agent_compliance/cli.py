@@ -1,15 +1,18 @@
 """CLI interface for NBX Agent Compliance."""
 
 import asyncio
+import json
 import os
 import sys
 import time
-from typing import Optional
+from typing import Awaitable, Dict, Optional, TypeVar
 import typer
 from rich.console import Console
-from rich.markdown import Markdown
 from dotenv import load_dotenv
-from .agent import run_once
+
+# The agent modules pull in openai-agents and LiteLLM, and rich.markdown pulls
+# in a markdown parser. Together they take seconds to import, so commands
+# import them when they run to keep --help and shell completion fast.
 
 load_dotenv()
 
@@ -19,6 +22,8 @@ app = typer.Typer(
 )
 console = Console()
 
+T = TypeVar("T")
+
 
 def main():
     """Main entry point for the CLI."""
@@ -27,8 +32,8 @@ def main():
 
 @app.command()
 def check(
-    rule: str = typer.Argument(
-        ...,
+    rule: Optional[str] = typer.Argument(
+        None,
         help="Natural language compliance rule to check (e.g., 'every interface should have an assigned ip address')",
     ),
     site: Optional[str] = typer.Option(
@@ -85,17 +90,64 @@ def check(
         "--max-steps",
         help="Maximum number of agent steps/tool calls",
     ),
+    no_cache: bool = typer.Option(
+        False,
+        "--no-cache",
+        help="Always run the check instead of reusing a result for unchanged NetBox data",
+    ),
+    triage_model: Optional[str] = typer.Option(
+        None,
+        "--triage-model",
+        help="Cheaper model that first screens out rules NetBox cannot check (e.g., openai/gpt-4o-mini)",
+    ),
+    triage_api_key: Optional[str] = typer.Option(
+        None,
+        "--triage-api-key",
+        envvar="TRIAGE_API_KEY",
+        help="API key for the triage model's provider (defaults to --api-key for the same provider)",
+    ),
+    rules_file: Optional[str] = typer.Option(
+        None,
+        "--rules-file",
+        help="JSON or YAML file with a list of rules to check instead of RULE, each a string or {rule, site, rack, device}",
+    ),
+    max_concurrency: int = typer.Option(
+        4,
+        "--max-concurrency",
+        min=1,
+        help="Maximum number of rules from --rules-file checked at the same time",
+    ),
 ):
     """Run a compliance check against NetBox."""
+    from rich.markdown import Markdown
+    from .agent import format_scope, run_once
+
+    if rules_file:
+        if rule:
+            console.print(
+                "[red]Error: Pass either a RULE or --rules-file, not both[/red]"
+            )
+            sys.exit(1)
+        _check_batch(
+            rules_file=rules_file,
+            default_scope=_build_scope(site, rack, device),
+            model=model,
+            api_key=api_key,
+            netbox_url=netbox_url,
+            netbox_token=netbox_token,
+            mcp_dir=mcp_dir,
+            limit=limit,
+            max_steps=max_steps,
+            max_concurrency=max_concurrency,
+        )
+        return
+
+    if not rule:
+        console.print("[red]Error: A RULE or --rules-file must be specified[/red]")
+        sys.exit(1)
 
     # Build scope dictionary
-    scope = {}
-    if site:
-        scope["site"] = site
-    if rack:
-        scope["rack"] = rack
-    if device:
-        scope["device"] = device
+    scope = _build_scope(site, rack, device)
 
     if not scope:
         console.print(
@@ -116,21 +168,16 @@ def check(
         )
         sys.exit(1)
 
-    # Expand user directory
-    mcp_dir = os.path.expanduser(mcp_dir)
-
     # Run the compliance check
     console.print(f"[blue]Running compliance check: {rule}[/blue]")
-    console.print(
-        f"[blue]Scope: {', '.join(f'{k}={v}' for k, v in scope.items())}[/blue]"
-    )
+    console.print(f"[blue]Scope: {format_scope(scope)}[/blue]")
     console.print(f"[blue]Model: {model}[/blue]\n")
 
     start_time = time.time()
 
     try:
         # Run the async agent
-        result = asyncio.run(
+        result = _run(
             run_once(
                 rule=rule,
                 scope=scope,
@@ -141,6 +188,9 @@ def check(
                 netbox_token=netbox_token,
                 limit=limit,
                 max_steps=max_steps,
+                use_cache=not no_cache,
+                triage_model=triage_model,
+                triage_api_key=triage_api_key,
             )
         )
 
@@ -148,8 +198,9 @@ def check(
 
         # Display the header
         console.print("\n[bold blue]Compliance Check Results[/bold blue]")
+        cached_note = " | Cached result" if result.get("cached") else ""
         console.print(
-            f"[dim]Time: {elapsed_time:.2f}s | Tool calls: {result.get('tool_calls', 0)}[/dim]\n"
+            f"[dim]Time: {elapsed_time:.2f}s | Tool calls: {result.get('tool_calls', 0)}{cached_note}[/dim]\n"
         )
 
         # Display the agent's markdown output directly
@@ -160,5 +211,139 @@ def check(
         sys.exit(1)
 
 
+def _check_batch(
+    rules_file: str,
+    default_scope: Dict[str, str],
+    model: str,
+    api_key: Optional[str],
+    netbox_url: str,
+    netbox_token: str,
+    mcp_dir: str,
+    limit: Optional[int],
+    max_steps: int,
+    max_concurrency: int,
+) -> None:
+    """Run several compliance checks against NetBox in one session."""
+    from rich.markdown import Markdown
+    from .agent import format_scope, run_batch
+
+    try:
+        entries = _load_rules_file(rules_file)
+    except Exception as e:
+        console.print(f"[red]Error reading rules file: {e}[/red]")
+        sys.exit(1)
+
+    # Each entry may carry its own scope; otherwise the CLI scope applies
+    rules = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"rule": entry}
+        if not isinstance(entry, dict):
+            console.print(
+                f"[red]Error: Every rule must be a string or an object with a rule text: {entry}[/red]"
+            )
+            sys.exit(1)
+        scope = (
+            _build_scope(entry.get("site"), entry.get("rack"), entry.get("device"))
+            or default_scope
+        )
+        if not entry.get("rule") or not scope:
+            console.print(
+                f"[red]Error: Every rule needs a rule text and at least one scope: {entry}[/red]"
+            )
+            sys.exit(1)
+        rules.append((entry["rule"], scope))
+
+    if not rules:
+        console.print("[yellow]No rules to check[/yellow]")
+        return
+
+    console.print(f"[blue]Running {len(rules)} compliance checks[/blue]")
+    console.print(f"[blue]Model: {model}[/blue]\n")
+
+    start_time = time.time()
+
+    try:
+        results = _run(
+            run_batch(
+                rules=rules,
+                model=model,
+                api_key=api_key,
+                mcp_dir=mcp_dir,
+                netbox_url=netbox_url,
+                netbox_token=netbox_token,
+                limit=limit,
+                max_steps=max_steps,
+                max_concurrency=max_concurrency,
+            )
+        )
+    except Exception as e:
+        console.print(f"[red]Error running compliance checks: {e}[/red]")
+        sys.exit(1)
+
+    elapsed_time = time.time() - start_time
+
+    for (rule, scope), result in zip(rules, results):
+        console.print(f"\n[bold blue]{rule}[/bold blue]")
+        console.print(
+            f"[dim]Scope: {format_scope(scope)} | "
+            f"Tool calls: {result.get('tool_calls', 0)}[/dim]\n"
+        )
+        console.print(Markdown(result.get("raw_output", "No output received")))
+
+    console.print(f"\n[dim]Total time: {elapsed_time:.2f}s[/dim]")
+
+
+def _build_scope(
+    site: Optional[str], rack: Optional[str], device: Optional[str]
+) -> Dict[str, str]:
+    """Build a scope dictionary from whichever of site, rack, and device are set."""
+
+    scope = {}
+    if site:
+        scope["site"] = site
+    if rack:
+        scope["rack"] = rack
+    if device:
+        scope["device"] = device
+    return scope
+
+
+def _run(coro: Awaitable[T]) -> T:
+    """Drive a check to completion, on uvloop when it is installed."""
+
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.run(_run_in_pool(coro))
+    return uvloop.run(_run_in_pool(coro))
+
+
+async def _run_in_pool(coro: Awaitable[T]) -> T:
+    """Await a check inside an MCP server pool, closed on the same loop."""
+    from .mcp import mcp_server_pool
+
+    async with mcp_server_pool():
+        return await coro
+
+
+def _load_rules_file(path: str) -> list:
+    """Load a list of rule entries from a JSON or YAML file."""
+
+    with open(os.path.expanduser(path)) as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("PyYAML is required to read YAML rule files")
+            entries = yaml.safe_load(f)
+        else:
+            entries = json.load(f)
+
+    if not isinstance(entries, list):
+        raise ValueError("rules file must contain a list of rules")
+    return entries
+
+
 if __name__ == "__main__":
     main()
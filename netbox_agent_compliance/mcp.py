@@ -6,14 +6,48 @@ This module handles the critical connection between the agent and NetBox:
 - Establishes secure stdio communication (no network exposure)
 - Filters available tools for safety (read-only by default)
 - Tracks metrics like tool call counts
+- Keeps connected servers in a pool so repeated checks reuse one subprocess
+
+Library users who run several checks should wrap them in mcp_server_pool():
+
+    async with mcp_server_pool():
+        for rule in rules:
+            await run_once(rule, ...)
+
+Inside the block every check shares one MCP subprocess per NetBox instance,
+and the block closes them on exit. Outside a pool block each check opens and
+closes its own server, as a plain `async with create_mcp_server(...)` would.
 
 MCP (Model Context Protocol) is the standard way to give LLMs access to
 external tools and data sources in a controlled, auditable manner.
 """
 
+import asyncio
+import contextlib
+import functools
+import json
 import os
-from typing import List, Optional, Any
+import time
+import weakref
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
 from agents.mcp import MCPServerStdio, create_static_tool_filter
+from mcp.types import CallToolResult, TextContent
+
+# orjson (from the 'fast' extra) speeds up parsing and re-encoding large
+# NetBox payloads; the stdlib json module is used when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Call history of the agent run in the current task, set by begin_run().
+# Concurrent runs sharing a pooled server each see only their own calls;
+# tasks the run spawns for parallel tool calls inherit the same dict.
+_CALL_HISTORY: ContextVar[Optional[Dict[str, int]]] = ContextVar(
+    "mcp_call_history", default=None
+)
 
 
 class CountingMCPServer(MCPServerStdio):
@@ -25,16 +59,400 @@ class CountingMCPServer(MCPServerStdio):
     - Understanding agent efficiency
     - Debugging excessive tool use
     - Showing users the work performed
+
+    A call repeated with identical arguments more than max_duplicate_calls
+    times in one agent run gets an error result instead of being sent, which
+    breaks the agent out of loops that would otherwise burn tokens until
+    max_turns. Each run started with begin_run() has its own count, so
+    concurrent runs sharing a server do not trip each other.
+
+    Text results larger than max_result_bytes are cut down before the agent
+    sees them, with a note asking it to narrow the query.
+
+    Successful results are kept for result_cache_ttl seconds, so the agent
+    re-fetching the same object in a later turn does not hit NetBox again.
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(
+        self,
+        *args,
+        max_duplicate_calls: int = 3,
+        max_result_bytes: Optional[int] = None,
+        result_cache_size: int = 256,
+        result_cache_ttl: float = 60.0,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.tool_call_count = 0
+        self.max_duplicate_calls = max_duplicate_calls
+        self.max_result_bytes = max_result_bytes
+        # Number of times each (tool, arguments) pair was called this session,
+        # used for calls made outside begin_run()
+        self._call_history: Dict[str, int] = {}
 
-    async def call_tool(self, *args, **kwargs) -> Any:
+        # Recent results keyed like the call history, oldest first
+        self.result_cache_size = result_cache_size
+        self.result_cache_ttl = result_cache_ttl
+        self.cache_hits = 0
+        self._result_cache: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # Event loop the connection lives on; stdio streams cannot move loops
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def connect(self):
+        """Override to remember which event loop owns the connection."""
+        await super().connect()
+        self._loop = asyncio.get_running_loop()
+        self.reset_session_state()
+
+    def reset_session_state(self) -> None:
+        """Forget per-session call history and results, e.g. before a new check."""
+        self._call_history.clear()
+        self._result_cache.clear()
+
+    def begin_run(self) -> None:
+        """Start a fresh duplicate-call history for the agent run in this task."""
+        _CALL_HISTORY.set({})
+
+    async def cleanup(self):
+        """Override to drop cached tools and results along with the connection."""
+        try:
+            await super().cleanup()
+        finally:
+            self.invalidate_tools_cache()
+            self.reset_session_state()
+
+    async def call_tool(
+        self,
+        tool_name: str,
+        arguments: Optional[Dict[str, Any]] = None,
+        *args,
+        **kwargs,
+    ) -> Any:
         """Override to count tool calls while preserving functionality."""
         self.tool_call_count += 1
-        return await super().call_tool(*args, **kwargs)
+
+        # Stop the agent from repeating the exact same call over and over.
+        # Repeats count even when the result cache could answer them, since a
+        # cached answer does not get a stuck agent out of its loop
+        call_key = _json_dumps([tool_name, arguments], sort_keys=True)
+        history = _CALL_HISTORY.get()
+        if history is None:
+            history = self._call_history
+        repeats = history.get(call_key, 0) + 1
+        history[call_key] = repeats
+        if repeats > self.max_duplicate_calls:
+            return _error_result(
+                f"Duplicate call detected: {tool_name} was already called "
+                f"{repeats - 1} times with these arguments. "
+                "Try a different approach or stop and report what you found."
+            )
+
+        # Answer repeated lookups from recent results instead of NetBox
+        cached = self._cached_result(call_key)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+
+        result = await super().call_tool(tool_name, arguments, *args, **kwargs)
+
+        # Keep huge NetBox responses from flooding the agent's context
+        if self.max_result_bytes:
+            result = _truncate_result(result, self.max_result_bytes)
+
+        if not _is_error(result):
+            self._store_result(call_key, result)
+        return result
+
+    def _cached_result(self, key: str) -> Any:
+        """Return a stored result that has not expired, or None."""
+        entry = self._result_cache.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.monotonic() - stored_at > self.result_cache_ttl:
+            del self._result_cache[key]
+            return None
+        self._result_cache.move_to_end(key)
+        return result
+
+    def _store_result(self, key: str, result: Any) -> None:
+        """Store a result, evicting the least recently used beyond the size cap."""
+        self._result_cache[key] = (time.monotonic(), result)
+        self._result_cache.move_to_end(key)
+        while len(self._result_cache) > self.result_cache_size:
+            self._result_cache.popitem(last=False)
+
+
+def _is_error(result: Any) -> bool:
+    """Check a tool result's error flag (isError in mcp 1.x, is_error in 2.x)."""
+    return bool(getattr(result, "is_error", getattr(result, "isError", False)))
+
+
+def _error_result(message: str) -> CallToolResult:
+    """Build a tool error result that the agent sees instead of NetBox data."""
+    return CallToolResult(
+        content=[TextContent(type="text", text=message)],
+        isError=True,
+    )
+
+
+def _json_loads(text: str) -> Any:
+    """Parse JSON with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _json_dumps(value: Any, sort_keys: bool = False) -> str:
+    """Encode compact JSON with orjson when available."""
+    if orjson is not None:
+        option = orjson.OPT_SORT_KEYS if sort_keys else 0
+        return orjson.dumps(value, option=option, default=str).decode("utf-8")
+    return json.dumps(value, sort_keys=sort_keys, default=str, separators=(",", ":"))
+
+
+_TRUNCATION_NOTE = (
+    "truncated: showing {shown} of {total} items; refine your filters, "
+    "request fewer fields, or page with offset"
+)
+
+
+def _truncate_result(result: Any, max_bytes: int) -> Any:
+    """Shrink oversized text items in a tool result to about max_bytes each."""
+    content = getattr(result, "content", None)
+    if not content:
+        return result
+
+    new_content = [
+        item.model_copy(update={"text": _truncate_text(item.text, max_bytes)})
+        if getattr(item, "type", None) == "text"
+        and len(item.text.encode("utf-8")) > max_bytes
+        else item
+        for item in content
+    ]
+    return result.model_copy(update={"content": new_content})
+
+
+def _truncate_text(text: str, max_bytes: int) -> str:
+    """Truncate a JSON list (or paginated results) by items, other text by bytes."""
+    try:
+        data = _json_loads(text)
+    except ValueError:
+        data = None
+
+    # NetBox list responses are either a plain list or {"count", "results", ...}
+    if isinstance(data, dict) and isinstance(data.get("results"), list):
+        items = data["results"]
+
+        def build(n: int) -> str:
+            note = _TRUNCATION_NOTE.format(shown=n, total=len(items))
+            return _json_dumps({**data, "results": items[:n], "truncated": note})
+
+    elif isinstance(data, list):
+        items = data
+
+        def build(n: int) -> str:
+            note = _TRUNCATION_NOTE.format(shown=n, total=len(items))
+            return _json_dumps(items[:n] + [note])
+
+    else:
+        cut = text.encode("utf-8")[:max_bytes].decode("utf-8", errors="ignore")
+        return cut + "\n...truncated, refine your filter"
+
+    # Binary search for the most items that still fit in the byte budget
+    low, high = 0, len(items)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if len(build(mid).encode("utf-8")) <= max_bytes:
+            low = mid
+        else:
+            high = mid - 1
+    return build(low)
+
+
+# Default cap on each tool result's size, roughly 8k tokens of JSON
+DEFAULT_MAX_RESULT_BYTES = 32768
+
+# Connected servers keyed by (mcp_dir, netbox_url, netbox_token,
+# max_result_bytes), so differently configured callers never share one.
+# Reusing a server skips the 'uv run' subprocess spawn and MCP handshake
+_SERVER_CACHE: Dict[Tuple[str, str, str, Optional[int]], CountingMCPServer] = {}
+
+# Serializes pool creation per event loop so concurrent acquisitions of the
+# same key share one server instead of orphaning a second subprocess
+_POOL_LOCKS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = (
+    weakref.WeakKeyDictionary()
+)
+
+# True while inside mcp_server_pool(); tasks started in the block inherit it
+_POOL_ACTIVE: ContextVar[bool] = ContextVar("mcp_pool_active", default=False)
+
+
+def _pool_lock() -> asyncio.Lock:
+    """Return the pool creation lock for the running event loop."""
+    loop = asyncio.get_running_loop()
+    lock = _POOL_LOCKS.get(loop)
+    if lock is None:
+        lock = _POOL_LOCKS[loop] = asyncio.Lock()
+    return lock
+
+
+async def get_or_create_mcp_server(
+    mcp_dir: str,
+    netbox_url: str,
+    netbox_token: str,
+    max_result_bytes: Optional[int] = DEFAULT_MAX_RESULT_BYTES,
+) -> CountingMCPServer:
+    """
+    Return a connected MCP server from the pool, spawning one if needed.
+
+    Pooled servers stay connected until shutdown_mcp_servers() is called,
+    which must happen on the same event loop (and task) that created them.
+    Prefer mcp_server_pool(), which does both.
+
+    Args:
+        mcp_dir: Directory containing the NetBox MCP server
+        netbox_url: NetBox instance URL
+        netbox_token: NetBox API token
+        max_result_bytes: Truncate larger tool results before the agent sees them
+            (None disables truncation)
+
+    Returns:
+        Connected CountingMCPServer instance
+    """
+
+    key = (
+        _validate_mcp_dir(mcp_dir),
+        netbox_url,
+        netbox_token,
+        max_result_bytes,
+    )
+    async with _pool_lock():
+        server = _SERVER_CACHE.get(key)
+        if (
+            server is not None
+            and server.session is not None
+            and server._loop is asyncio.get_running_loop()
+        ):
+            return server
+
+        server = create_mcp_server(
+            mcp_dir=mcp_dir,
+            netbox_url=netbox_url,
+            netbox_token=netbox_token,
+            max_result_bytes=max_result_bytes,
+        )
+        await server.connect()
+        _SERVER_CACHE[key] = server
+        return server
+
+
+async def shutdown_mcp_servers() -> None:
+    """
+    Disconnect every pooled MCP server owned by the running event loop.
+
+    Call it from the task that created the servers (usually the one that
+    entered mcp_server_pool(), which calls this on exit).
+    """
+
+    loop = asyncio.get_running_loop()
+    servers = list(_SERVER_CACHE.values())
+    _SERVER_CACHE.clear()
+    for server in servers:
+        # Servers from a closed loop are already gone with their loop
+        if server._loop is loop:
+            await server.cleanup()
+
+
+@contextlib.asynccontextmanager
+async def mcp_server_pool() -> AsyncIterator[None]:
+    """
+    Share pooled MCP servers across every check run inside this block.
+
+    Servers are closed when the block exits. Nested blocks reuse the
+    outermost pool. To run checks concurrently (e.g. with asyncio.gather),
+    call agent.preload() in the block first so the server is opened by the
+    same task that will close it.
+    """
+
+    if _POOL_ACTIVE.get():
+        yield
+        return
+
+    token = _POOL_ACTIVE.set(True)
+    try:
+        yield
+    finally:
+        _POOL_ACTIVE.reset(token)
+        await shutdown_mcp_servers()
+
+
+@contextlib.asynccontextmanager
+async def acquire_mcp_server(
+    mcp_dir: str,
+    netbox_url: str,
+    netbox_token: str,
+    max_result_bytes: Optional[int] = DEFAULT_MAX_RESULT_BYTES,
+) -> AsyncIterator[CountingMCPServer]:
+    """
+    Yield a connected MCP server for one check.
+
+    Inside mcp_server_pool() the server comes from the pool and stays
+    connected afterwards; otherwise a private server is opened and closed
+    around the check.
+    """
+
+    if _POOL_ACTIVE.get():
+        yield await get_or_create_mcp_server(
+            mcp_dir=mcp_dir,
+            netbox_url=netbox_url,
+            netbox_token=netbox_token,
+            max_result_bytes=max_result_bytes,
+        )
+        return
+
+    async with create_mcp_server(
+        mcp_dir=mcp_dir,
+        netbox_url=netbox_url,
+        netbox_token=netbox_token,
+        max_result_bytes=max_result_bytes,
+    ) as server:
+        yield server
+
+
+# Snapshot of the parent environment, taken on first use so that variables
+# loaded from .env by the CLI are included
+_BASE_ENV: Optional[Dict[str, str]] = None
+
+
+def _subprocess_env(netbox_url: str, netbox_token: str) -> Dict[str, str]:
+    """Build the MCP subprocess environment from the cached snapshot."""
+    global _BASE_ENV
+    if _BASE_ENV is None:
+        _BASE_ENV = dict(os.environ)
+
+    # Copying a plain dict is much cheaper than re-reading os.environ
+    env = _BASE_ENV.copy()
+    env["NETBOX_URL"] = netbox_url
+    env["NETBOX_TOKEN"] = netbox_token
+    return env
+
+
+@functools.lru_cache(maxsize=8)
+def _validate_mcp_dir(mcp_dir: str) -> str:
+    """
+    Expand and verify an MCP server directory, caching successful checks.
+
+    A missing directory raises and is not cached, so it is re-checked next time.
+    """
+    mcp_dir = os.path.expanduser(mcp_dir)
+    pyproject_path = os.path.join(mcp_dir, "pyproject.toml")
+    if not os.path.exists(pyproject_path):
+        raise FileNotFoundError(
+            f"NetBox MCP server not found at {mcp_dir}. "
+            f"Please ensure the netbox-mcp-server is installed at {mcp_dir}"
+        )
+    return mcp_dir
 
 
 def create_mcp_server(
@@ -42,7 +460,8 @@ def create_mcp_server(
     netbox_url: str,
     netbox_token: str,
     allowed_tools: Optional[List[str]] = None,
-) -> MCPServerStdio:
+    max_result_bytes: Optional[int] = DEFAULT_MAX_RESULT_BYTES,
+) -> CountingMCPServer:
     """
     Create an MCP server connection to the NetBox MCP server.
 
@@ -62,9 +481,11 @@ def create_mcp_server(
         netbox_url: NetBox instance URL
         netbox_token: NetBox API token
         allowed_tools: List of allowed tool names (defaults to read-only tools)
+        max_result_bytes: Truncate larger tool results before the agent sees them
+            (None disables truncation)
 
     Returns:
-        MCPServerStdio instance configured for NetBox
+        CountingMCPServer instance configured for NetBox (not yet connected)
     """
 
     # Default to read-only tools for safety
@@ -79,19 +500,14 @@ def create_mcp_server(
         ]
 
     # Expand user directory and verify the MCP server directory exists
-    mcp_dir = os.path.expanduser(mcp_dir)
-    pyproject_path = os.path.join(mcp_dir, "pyproject.toml")
-    if not os.path.exists(pyproject_path):
-        raise FileNotFoundError(
-            f"NetBox MCP server not found at {mcp_dir}. "
-            f"Please ensure the netbox-mcp-server is installed at {mcp_dir}"
-        )
+    mcp_dir = _validate_mcp_dir(mcp_dir)
 
     # Create the MCP server configuration
     # Key design decisions:
     # - Use 'uv run' for consistent Python environment management
     # - Pass credentials via env vars (more secure than CLI args)
     # - Filter tools to prevent accidental modifications
+    # - Cache the tool list, which never changes while connected
     # - Wrap in our counting class for metrics
     server = CountingMCPServer(
         name="netbox",
@@ -100,16 +516,17 @@ def create_mcp_server(
             "command": "uv",
             "args": ["--directory", mcp_dir, "run", "netbox-mcp-server"],
             # Environment variables for the subprocess
-            "env": {
-                "NETBOX_URL": netbox_url,
-                "NETBOX_TOKEN": netbox_token,
-                # Inherit current environment for PATH, etc.
-                **os.environ,
-            },
+            # Inherits the current environment for PATH, etc.
+            "env": _subprocess_env(netbox_url, netbox_token),
         },
         # Critical: Filter tools to only allow safe operations
         # This prevents the agent from accidentally modifying NetBox data
         tool_filter=create_static_tool_filter(allowed_tool_names=allowed_tools),
+        # The tool list is fixed for a connected server, so fetch it only once
+        # instead of on every agent turn; pooled servers reuse it across runs
+        cache_tools_list=True,
+        # Bound the size of each tool result that enters the LLM context
+        max_result_bytes=max_result_bytes,
     )
 
     return server
@@ -120,3 +537,10 @@ def create_mcp_server(
 # 2. To use a different MCP server, change the spawn command
 # 3. To add authentication, modify the env vars passed
 # 4. To track more metrics, extend the CountingMCPServer class
+# 5. To use a faster transport than stdio pipes (e.g. a Unix domain socket for
+#    a long-lived pooled server), neither MCPServerStdio nor netbox-mcp-server
+#    supports one today. The extension point is create_streams(): subclass
+#    agents.mcp.server._MCPServerWithClientSession and return an async context
+#    manager yielding (read, write) anyio streams of mcp SessionMessage objects,
+#    framed as newline-delimited JSON-RPC over asyncio.open_unix_connection().
+#    The server side would need a matching --transport option upstream.
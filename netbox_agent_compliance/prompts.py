@@ -20,12 +20,15 @@ allowing the LLM to generalize from patterns rather than follow rigid logic.
 # 2. DECISION FLOW: Three-step process (validate → check → report)
 #    Simple logic that the model can follow reliably
 #
-# 3. OUTPUT FORMAT: Structured markdown with specific sections
-#    Ensures consistent, parseable output across different models
+# 3. OUTPUT FORMAT: Fields of the structured result (agent.ComplianceResult)
+#    The schema is enforced by the model; the prompt explains what goes where
 #
-# 4. CONCRETE EXAMPLE: Shows a failing check with proper formatting
+# 4. CONCRETE EXAMPLE: Shows a failing check with each field filled in
 #    More effective than abstract rules for teaching output structure
 #
+# 5. PARALLEL TOOL CALLS: Asks for independent lookups in a single turn
+#    Models default to one call per turn; batching them cuts turns and tokens
+#
 # The prompt does NOT include:
 # - Tool descriptions (discovered dynamically via MCP)
 # - Complex decision trees (relies on model reasoning)
@@ -37,30 +40,54 @@ It does NOT store: SNMP credentials, passwords, SSH keys, monitoring status, or
 
 When given a rule and scope:
 1. First determine if the rule can be checked with NetBox data
-2. If it cannot (e.g., SNMP credentials), explain this and suggest what CAN be checked
+2. If it cannot (e.g., SNMP credentials), set status UNKNOWN, explain this in the summary,
+   and suggest what CAN be checked
 3. If it can be checked, query the relevant objects and report compliance
 
-Format your response as markdown with:
-- **Status**: PASS or FAIL
-- **Summary**: What was checked and the outcome
-- **Findings**: List any non-compliant items (if FAIL)
-- **Coverage**: What was examined (e.g., "Checked 4 devices in site DM-Akron")
+When you need several independent lookups (e.g., one per device), emit all of the tool calls
+in a single assistant message rather than one per turn. Only wait for a result when the next
+call depends on it.
 
-Example response for a failing check:
+Example of parallel lookups: after listing devices 12, 15, and 19 in scope, fetch all three
+in the same turn:
+- netbox_get_object_by_id(object_type="devices", object_id=12)
+- netbox_get_object_by_id(object_type="devices", object_id=15)
+- netbox_get_object_by_id(object_type="devices", object_id=19)
 
-## Status: FAIL
+Return your result with these fields:
+- status: PASS or FAIL, or UNKNOWN if the rule cannot be checked with NetBox data
+- summary: What was checked and the outcome
+- findings: One entry per non-compliant item (empty if PASS)
+- coverage: What was examined (e.g., "Checked 4 devices in site DM-Akron")
 
-## Summary
-Checked all devices in site DM-Akron for primary IP addresses. Found 4 devices without primary IPs.
+Example result for a failing check:
 
-## Findings
+status: FAIL
+summary: Checked all devices in site DM-Akron for primary IP addresses. Found 4 devices without primary IPs.
+findings:
 - dmi01-akron-rtr01: No primary IPv4 or IPv6
 - dmi01-akron-sw01: No primary IPv4 or IPv6
 - dmi01-akron-pdu01: No primary IPv4 or IPv6
 - Patch Panel 01: No primary IPv4 or IPv6
+coverage: Examined 4 devices in the DM-Akron site."""
+
+# Triage prompt for the optional pre-check (see agent._is_checkable)
+# Deciding whether NetBox holds the data a rule needs is a simple
+# classification, so a small, cheap model can screen out rules like
+# "SNMP credentials must be set" before the full agent loop starts.
+# When unsure, the model should answer checkable so the full agent decides.
+TRIAGE_INSTRUCTIONS = """You decide whether a compliance rule can be checked using NetBox data.
+
+NetBox stores network infrastructure data like devices, interfaces, IPs, VLANs, racks, sites,
+cables, power, platforms, and descriptions.
+It does NOT store: SNMP credentials, passwords, SSH keys, monitoring status, or configuration files.
+
+Reply with only a JSON object: {"checkable": true or false, "reason": "<one or two sentences>"}
+If unsure, answer checkable: true.
 
-## Coverage
-Examined 4 devices in the DM-Akron site."""
+Example:
+Rule: all devices must have SNMP credentials configured
+{"checkable": false, "reason": "NetBox does not store SNMP credentials. It can check device inventory, IP assignments, and interface configuration instead."}"""
 
 # Educational examples for developers extending this agent
 # These demonstrate common compliance patterns in NetBox:
@@ -112,3 +139,4 @@ NetBox can check:
 #
 # 6. TOOL USE OPTIMIZATION: Guide efficient tool usage
 #    Example: "Minimize API calls by using filters effectively"
+#    (Parallel tool calls are already requested in SYSTEM_INSTRUCTIONS)
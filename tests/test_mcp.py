@@ -0,0 +1,68 @@
+"""Tests for the duplicate-call guard in CountingMCPServer."""
+
+import asyncio
+
+from agents.mcp import MCPServerStdio
+from mcp.types import CallToolResult, TextContent
+
+from netbox_agent_compliance.mcp import CountingMCPServer
+
+
+def _make_server(monkeypatch, max_duplicate_calls=3):
+    """Build a server whose underlying tool calls succeed without a subprocess."""
+    sent = []
+
+    async def fake_call_tool(self, tool_name, arguments, meta=None):
+        sent.append((tool_name, arguments))
+        await asyncio.sleep(0)
+        return CallToolResult(content=[TextContent(type="text", text="[]")])
+
+    monkeypatch.setattr(MCPServerStdio, "call_tool", fake_call_tool)
+    server = CountingMCPServer(
+        params={"command": "true"}, max_duplicate_calls=max_duplicate_calls
+    )
+    return server, sent
+
+
+def _is_refused(result):
+    return result.content[0].text.startswith("Duplicate call detected")
+
+
+def test_repeat_past_limit_is_refused_even_when_cached(monkeypatch):
+    server, sent = _make_server(monkeypatch, max_duplicate_calls=3)
+    arguments = {"object_type": "devices", "filters": {"site_id": 1}}
+
+    async def run():
+        server.begin_run()
+        return [
+            await server.call_tool("netbox_get_objects", arguments) for _ in range(5)
+        ]
+
+    results = asyncio.run(run())
+
+    assert [_is_refused(result) for result in results] == [
+        False,
+        False,
+        False,
+        True,
+        True,
+    ]
+    # The first call reached NetBox; the next two came from the result cache
+    assert len(sent) == 1
+    assert server.cache_hits == 2
+
+
+def test_concurrent_runs_keep_separate_histories(monkeypatch):
+    server, _ = _make_server(monkeypatch, max_duplicate_calls=3)
+    arguments = {"object_type": "devices", "filters": {}}
+
+    async def run_rule():
+        server.begin_run()
+        return await server.call_tool("netbox_get_objects", arguments)
+
+    async def run_batch():
+        return await asyncio.gather(*[run_rule() for _ in range(5)])
+
+    results = asyncio.run(run_batch())
+
+    assert not any(_is_refused(result) for result in results)